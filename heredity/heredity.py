@@ -1,7 +1,15 @@
+import argparse
 import csv
+import functools
+import heapq
 import itertools
+import json
 import math
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 PROBS = {
 
@@ -37,16 +45,82 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Possible numbers of copies of the gene
+GENES = (0, 1, 2)
+
+# Most gene variables a factor may have during variable elimination
+MAX_FACTOR_VARIABLES = 14
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Compute gene and trait probabilities for a family."
+    )
+    parser.add_argument("data", help="CSV file describing the family, or a "
+                        "directory of such files for batch mode")
+    parser.add_argument("--batch", action="store_true",
+                        help="treat data as a manifest listing one family "
+                        "file per line")
+    parser.add_argument("--method", choices=sorted(METHODS), default="eliminate",
+                        help="inference method (default: eliminate)")
+    parser.add_argument("--samples", type=int, default=1000,
+                        help="samples per chain for --method sample")
+    parser.add_argument("--burn-in", type=int, default=100,
+                        help="samples discarded per chain for --method sample")
+    parser.add_argument("--chains", type=int, default=4,
+                        help="independent chains for --method sample")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed for --method sample")
+    parser.add_argument("--output", default="-",
+                        help="batch mode output file, .csv or .jsonl (default: "
+                        "JSON lines on standard output)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes to run batch mode in (default: one per CPU)")
+    args = parser.parse_args()
+
+    # Options passed on to the inference method
+    options = dict()
+    if args.method == "sample":
+        options = dict(samples=args.samples, burn_in=args.burn_in,
+                       chains=args.chains, seed=args.seed)
+
+    # Run every family in a directory or manifest
+    if args.batch or os.path.isdir(args.data):
+        files = family_files(args.data)
+        written = batch(files, args.output, method=args.method,
+                        workers=args.workers, **options)
+        if written < len(files):
+            sys.exit(f"Skipped {len(files) - written} of {len(files)} families")
+        return
+
+    people = load_data(args.data)
 
     # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    if args.method == "sample":
+        diagnostics = dict()
+        probabilities = infer(people, args.method, diagnostics=diagnostics, **options)
+        print(f"Gibbs sampling: {args.chains} chains of {args.samples} samples, "
+              f"largest R-hat {diagnostics['r_hat']:.3f}")
+    else:
+        probabilities = infer(people, args.method)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def empty_probabilities(people):
+    """
+    Return a probabilities dictionary with every distribution set to 0.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -61,38 +135,594 @@ def main():
         for person in people
     }
 
+
+def enumerate_probabilities(people):
+    """
+    Compute every person's gene and trait distributions by summing the
+    joint probability of every assignment consistent with the evidence.
+    Known traits stay fixed, so only the traits of people without
+    evidence are enumerated.
+    """
+    probabilities = empty_probabilities(people)
+
+    # Only people whose trait is unknown can go either way
+    names = list(people)
+    known = {person for person in names if people[person]["trait"]}
+    unknown = [person for person in names if people[person]["trait"] is None]
+
+    # Joint probabilities are accumulated relative to the largest seen so far,
+    # so that large families do not underflow to 0
+    offset = -math.inf
+
     # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    for extra in subsets(unknown):
+        have_trait = known.union(extra)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+        # Loop over all ways of giving people the gene
+        for one_gene, two_genes in gene_assignments(names):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+            # Update probabilities with new joint probability
+            log_p = joint_probability(people, one_gene, two_genes, have_trait, log=True)
+            if log_p > offset:
+                if offset > -math.inf:
+                    rescale(probabilities, math.exp(offset - log_p))
+                offset = log_p
+            update(probabilities, one_gene, two_genes, have_trait, math.exp(log_p - offset))
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
+
+def rescale(probabilities, factor):
+    """
+    Multiply every value in `probabilities` by `factor`.
+    """
+    for person in probabilities:
         for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
             for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+                probabilities[person][field][value] *= factor
+
+
+def subsets(s):
+    """
+    Generate every subset of `s` as a tuple, one at a time.
+    """
+    s = list(s)
+    return itertools.chain.from_iterable(
+        itertools.combinations(s, r) for r in range(len(s) + 1)
+    )
+
+
+def gene_assignments(names):
+    """
+    Generate every `(one_gene, two_genes)` pair of disjoint sets of
+    `names`, one at a time.
+    """
+    for genes in itertools.product(GENES, repeat=len(names)):
+        one_gene = set()
+        two_genes = set()
+        for name, g in zip(names, genes):
+            if g == 1:
+                one_gene.add(name)
+            elif g == 2:
+                two_genes.add(name)
+        yield one_gene, two_genes
+
+
+def vectorized_probabilities(people, block=3 ** 10):
+    """
+    Compute every person's gene and trait distributions by exact
+    enumeration like `enumerate_probabilities`, but computing joint
+    probabilities for `block` gene assignments at a time.
+
+    Traits of people without evidence are summed out directly: each
+    only depends on that person's own gene count.
+    """
+    names = list(people)
+    traits = [people[person]["trait"] for person in names]
+    powers = 3 ** np.arange(len(names), dtype=np.int64)
+    totals = np.zeros((len(names), len(GENES)))
+
+    for start in range(0, 3 ** len(names), block):
+        indices = np.arange(start, min(start + block, 3 ** len(names)), dtype=np.int64)
+        genes = (indices[:, None] // powers) % 3
+        p = joint_probabilities(people, names, genes, traits)
+        for n in range(len(names)):
+            totals[n] += np.bincount(genes[:, n], weights=p, minlength=len(GENES))
+
+    probabilities = empty_probabilities(people)
+    for n, person in enumerate(names):
+        for g in GENES:
+            probabilities[person]["gene"][g] = totals[n, g] / totals[n].sum()
+        fill_trait(probabilities, people, person)
+    return probabilities
+
+
+def joint_probabilities(people, names, genes, traits):
+    """
+    Compute the joint probability of many gene assignments at once.
+
+    `genes` is an integer array with one row per assignment, holding the
+    gene count of each person in `names`. `traits` lists whether each of
+    them has the trait, or None to leave that trait out, which is the
+    same as summing over both values.
+    Return an array with the joint probability of each row.
+    """
+    column = {name: n for n, name in enumerate(names)}
+    inheritance = inheritance_table()
+    unconditional = np.array([PROBS["gene"][g] for g in GENES])
+
+    p = np.ones(len(genes))
+    for n, person in enumerate(names):
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother and father:
+            p *= inheritance[genes[:, n], genes[:, column[mother]], genes[:, column[father]]]
+        else:
+            p *= unconditional[genes[:, n]]
+        if traits[n] is not None:
+            likelihood = np.array([PROBS["trait"][g][traits[n]] for g in GENES])
+            p *= likelihood[genes[:, n]]
+    return p
+
+
+def gibbs_probabilities(people, samples=1000, burn_in=100, chains=4,
+                        seed=None, diagnostics=None):
+    """
+    Estimate every person's gene and trait distributions by Gibbs
+    sampling gene counts given the known traits, for families too large
+    for exact inference.
+
+    `chains` independent chains each discard `burn_in` sweeps and then
+    record `samples` sweeps. Every sweep resamples each person's gene
+    count from its distribution given everyone else's. People who share
+    no factor are resampled together. Estimates average those
+    distributions rather than the sampled values, which lowers variance.
+
+    If `diagnostics` is a dictionary, "r_hat" is set to the largest
+    Gelman-Rubin statistic over all gene counts; values near 1 suggest
+    the chains have converged.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(people)
+    index = {name: n for n, name in enumerate(names)}
+    inheritance = np.log(inheritance_table())
+    unconditional = np.log([PROBS["gene"][g] for g in GENES])
+
+    # Each person's own factor as a function of their parents' genes
+    mothers = np.array([index.get(people[name]["mother"], -1) for name in names])
+    fathers = np.array([index.get(people[name]["father"], -1) for name in names])
+    evidence = np.zeros((len(names), len(GENES)))
+    for n, name in enumerate(names):
+        if people[name]["trait"] is not None:
+            evidence[n] = np.log([PROBS["trait"][g][people[name]["trait"]] for g in GENES])
+
+    # Group people so that no two in a group share a factor
+    groups = []
+    for members in color_groups(people, names):
+        members = np.array(members)
+        position = {n: k for k, n in enumerate(members)}
+        edges = [
+            (child, position[n], role)
+            for child in range(len(names))
+            for role, n in enumerate((mothers[child], fathers[child]))
+            if n in position
+        ]
+        groups.append((members, np.array(edges, dtype=int).reshape(-1, 3)))
+
+    # Start every chain from the unconditional distribution
+    genes = rng.choice(len(GENES), size=(chains, len(names)),
+                       p=[PROBS["gene"][g] for g in GENES])
+    totals = np.zeros((chains, len(names), len(GENES)))
+    counts = np.zeros((chains, len(names), len(GENES)))
+
+    for sweep in range(burn_in + samples):
+        for members, edges in groups:
+
+            # Log probability of each gene count for each member and chain
+            weights = np.broadcast_to(evidence[members], (chains, len(members), 3)).copy()
+            founders = mothers[members] < 0
+            weights[:, founders] += unconditional
+            children = members[~founders]
+            weights[:, ~founders] += inheritance[
+                :, genes[:, mothers[children]], genes[:, fathers[children]]
+            ].transpose(1, 2, 0)
+            if len(edges):
+                child, member, role = edges.T
+                own = genes[:, child]
+                other = genes[:, np.where(role == 0, fathers[child], mothers[child])]
+                g = np.arange(3)[:, None, None]
+                term = np.where(role == 0,
+                                inheritance[own, g, other],
+                                inheritance[own, other, g]).transpose(1, 2, 0)
+                np.add.at(weights, (slice(None), member), term)
+
+            weights = np.exp(weights - weights.max(axis=2, keepdims=True))
+            weights /= weights.sum(axis=2, keepdims=True)
+            draws = rng.random((chains, len(members), 1))
+            genes[:, members] = (draws > weights.cumsum(axis=2)[:, :, :2]).sum(axis=2)
+
+            if sweep >= burn_in:
+                totals[:, members] += weights
+                counts[:, members] += genes[:, members, None] == np.arange(3)
+
+    if diagnostics is not None:
+        diagnostics["r_hat"] = gelman_rubin(counts, samples)
+
+    probabilities = empty_probabilities(people)
+    estimate = totals.sum(axis=0) / (chains * samples)
+    for n, person in enumerate(names):
+        for g in GENES:
+            probabilities[person]["gene"][g] = estimate[n, g]
+        fill_trait(probabilities, people, person)
+    return probabilities
+
+
+def color_groups(people, names):
+    """
+    Split `names` into groups such that no two people in a group are
+    parent and child or parents of the same child.
+    """
+    neighbors = {name: set() for name in names}
+    for name in names:
+        family = {name, people[name]["mother"], people[name]["father"]} - {None}
+        for member in family:
+            neighbors[member] |= family - {member}
+
+    color = dict()
+    for name in names:
+        used = {color[neighbor] for neighbor in neighbors[name] if neighbor in color}
+        color[name] = next(c for c in itertools.count() if c not in used)
+
+    groups = [[] for _ in range(max(color.values(), default=-1) + 1)]
+    for n, name in enumerate(names):
+        groups[color[name]].append(n)
+    return groups
+
+
+def gelman_rubin(counts, samples):
+    """
+    Return the largest Gelman-Rubin statistic over all people and gene
+    counts, given per-chain sums of sampled indicators.
+    """
+    chains = counts.shape[0]
+    if chains < 2 or samples < 2:
+        return float("nan")
+    means = counts / samples
+
+    # Indicators are 0 or 1, so the sum of their squares is their sum
+    variances = (counts - samples * means ** 2) / (samples - 1)
+    within = variances.mean(axis=0)
+    between = samples * means.var(axis=0, ddof=1)
+    pooled = (samples - 1) / samples * within + between / samples
+    mixing = within > 0
+    if not mixing.any():
+        return 1.0
+    return float(np.sqrt(pooled[mixing] / within[mixing]).max())
+
+
+def eliminate_probabilities(people):
+    """
+    Compute every person's gene and trait distributions by variable
+    elimination over the gene variables.
+
+    Each person contributes one factor: the probability of their gene
+    count given their parents' (or unconditionally, for people without
+    parents), times the probability of their trait if it is known.
+    Variables are summed out one at a time in an order that keeps
+    factors small for tree-like families, and the intermediate results
+    are reused to find every person's distribution in a second pass.
+    """
+    factors = []
+    for person in people:
+        evidence = np.array([
+            1 if people[person]["trait"] is None
+            else PROBS["trait"][g][people[person]["trait"]]
+            for g in GENES
+        ])
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother and father:
+            table = inheritance_table() * evidence[:, None, None]
+            factors.append(((person, mother, father), table))
+        else:
+            table = np.array([PROBS["gene"][g] for g in GENES]) * evidence
+            factors.append(((person,), table))
+
+    marginals = eliminate(factors, elimination_order(factors))
+    probabilities = empty_probabilities(people)
+    for person in people:
+        gene = marginals[person] / marginals[person].sum()
+        for g in GENES:
+            probabilities[person]["gene"][g] = gene[g]
+        fill_trait(probabilities, people, person)
+    return probabilities
+
+
+def fill_trait(probabilities, people, person):
+    """
+    Set `person`'s trait distribution from their gene distribution,
+    or to certainty if their trait is known.
+    """
+    trait = people[person]["trait"]
+    for value in (True, False):
+        if trait is not None:
+            p = 1 if value == trait else 0
+        else:
+            p = sum(
+                probabilities[person]["gene"][g] * PROBS["trait"][g][value]
+                for g in GENES
+            )
+        probabilities[person]["trait"][value] = p
+
+
+def inheritance_table():
+    """
+    Return an array whose entry `[child, mother, father]` is the
+    probability of the child having `child` copies of the gene given
+    the parents' gene counts.
+    """
+    return np.array(cpt_tables()["inheritance"])
+
+
+def elimination_order(factors):
+    """
+    Return an order in which to sum out the variables of `factors`,
+    greedily choosing the variable with the fewest neighbors in the
+    graph connecting variables that share a factor.
+    """
+    graph = dict()
+    for names, _ in factors:
+        for name in names:
+            graph.setdefault(name, set()).update(set(names) - {name})
+
+    # Heap entries go stale when a variable's neighbors change
+    heap = [(len(neighbors), variable) for variable, neighbors in graph.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        degree, variable = heapq.heappop(heap)
+        if variable not in graph or degree != len(graph[variable]):
+            continue
+        neighbors = graph.pop(variable)
+        for neighbor in neighbors:
+            graph[neighbor] |= neighbors - {neighbor}
+            graph[neighbor].discard(variable)
+            heapq.heappush(heap, (len(graph[neighbor]), neighbor))
+        order.append(variable)
+    return order
+
+
+def eliminate(factors, order):
+    """
+    Return a dictionary mapping each variable of `factors` to an array
+    proportional to its marginal distribution, where each factor is a
+    tuple of variable names and an array with one axis of length 3 per
+    variable.
+
+    Variables are summed out in `order` (bucket elimination). Each
+    bucket passes a message on to the bucket of the first variable
+    left in it. A second pass sends messages back down, so that every
+    bucket sees all of the factors.
+    """
+    position = {variable: n for n, variable in enumerate(order)}
+
+    # Each factor waits in the bucket of its first variable to be eliminated
+    buckets = [[] for _ in order]
+    for factor in factors:
+        buckets[min(position[name] for name in factor[0])].append(factor)
+
+    # Pass messages up, each to the bucket of its first remaining variable
+    up = dict()
+    parent = dict()
+    children = [[] for _ in order]
+    for n, variable in enumerate(order):
+        names, table = multiply(buckets[n] + [up[c] for c in children[n]])
+        if len(names) > MAX_FACTOR_VARIABLES:
+            raise Exception("Family is too interconnected for exact inference")
+        message = marginalize((names, table), [name for name in names if name != variable])
+        if message[0]:
+            parent[n] = min(position[name] for name in message[0])
+            children[parent[n]].append(n)
+            up[n] = message
+
+    # Pass messages back down, each summarizing everything else
+    down = dict()
+    marginals = dict()
+    for n in reversed(range(len(order))):
+        incoming = [up[c] for c in children[n]]
+        if n in down:
+            incoming.append(down[n])
+        belief = multiply(buckets[n] + incoming)
+        marginals[order[n]] = marginalize(belief, [order[n]])[1]
+        for k, c in enumerate(children[n]):
+            others = incoming[:k] + incoming[k + 1:]
+            down[c] = marginalize(multiply(buckets[n] + others), up[c][0])
+    return marginals
+
+
+def marginalize(factor, keep):
+    """
+    Sum every variable not in `keep` out of `factor`, returning a factor
+    over the variables of `keep` it has, in that order, rescaled so that
+    large families don't underflow.
+    """
+    names, table = factor
+    axes = tuple(axis for axis, name in enumerate(names) if name not in keep)
+    table = table.sum(axis=axes)
+    remaining = [name for name in names if name in keep]
+    keep = [name for name in keep if name in remaining]
+    table = table.transpose([remaining.index(name) for name in keep])
+    return tuple(keep), table / table.max()
+
+
+def multiply(factors):
+    """
+    Return the product of `factors` as a single factor.
+    """
+    names = []
+    for factor_names, _ in factors:
+        for name in factor_names:
+            if name not in names:
+                names.append(name)
+    names = tuple(names)
+
+    product = np.ones([1] * len(names))
+    for factor_names, table in factors:
+        order = sorted(range(len(factor_names)),
+                       key=lambda axis: names.index(factor_names[axis]))
+        shape = [3 if name in factor_names else 1 for name in names]
+        product = product * table.transpose(order).reshape(shape)
+    return names, product
+
+
+# Inference methods that can be chosen from the command line
+METHODS = {
+    "enumerate": enumerate_probabilities,
+    "vectorize": vectorized_probabilities,
+    "eliminate": eliminate_probabilities,
+    "sample": gibbs_probabilities
+}
+
+
+def infer(people, method="eliminate", diagnostics=None, **options):
+    """
+    Compute every person's gene and trait distributions with the inference
+    method named `method`. Exact methods run separately on each unrelated
+    family in `people`, since families share no information. Sampling runs
+    once on everyone, as its sweeps already resample unrelated people
+    together; `diagnostics` is passed on to it.
+    """
+    if method == "sample":
+        return gibbs_probabilities(people, diagnostics=diagnostics, **options)
+
+    probabilities = dict()
+    for family in components(people):
+        probabilities.update(METHODS[method](family, **options))
+
+    # Keep people in the order they were given
+    return {person: probabilities[person] for person in people}
+
+
+def components(people):
+    """
+    Split `people` into unrelated families, people connected through
+    mother and father links, and return a list of their dictionaries.
+    """
+    relatives = {person: set() for person in people}
+    for person in people:
+        for parent in (people[person]["mother"], people[person]["father"]):
+            if parent is not None:
+                relatives[person].add(parent)
+                relatives[parent].add(person)
+
+    position = {person: i for i, person in enumerate(people)}
+    families = []
+    seen = set()
+    for person in people:
+        if person in seen:
+            continue
+
+        # Collect everyone reachable from this person
+        seen.add(person)
+        family = [person]
+        frontier = [person]
+        while frontier:
+            for relative in relatives[frontier.pop()]:
+                if relative not in seen:
+                    seen.add(relative)
+                    family.append(relative)
+                    frontier.append(relative)
+
+        families.append({
+            name: people[name] for name in sorted(family, key=position.get)
+        })
+    return families
+
+
+def family_files(path):
+    """
+    Return the list of family CSV files named by `path`, which is either
+    a directory (every .csv file in it) or a manifest listing one file per
+    line. Blank lines and lines starting with # in a manifest are ignored,
+    and relative paths are taken relative to the manifest.
+    """
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, filename) for filename in os.listdir(path)
+            if filename.endswith(".csv")
+        )
+
+    files = []
+    directory = os.path.dirname(path)
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                files.append(os.path.join(directory, line))
+    return files
+
+
+def infer_file(job):
+    """
+    Load the family in `job = (filename, method, options)` and run the
+    inference method on it. Return `(filename, probabilities, error)`,
+    where `error` is None unless inference failed.
+    """
+    filename, method, options = job
+    try:
+        people = load_data(filename)
+        return filename, infer(people, method, **options), None
+    except Exception as e:
+        return filename, None, str(e) or type(e).__name__
+
+
+def batch(files, output="-", method="eliminate", workers=None, **options):
+    """
+    Run inference on every family file in `files` across a pool of
+    `workers` processes and write one row of marginals per person to
+    `output`, as CSV if it ends in .csv and as JSON lines otherwise.
+    Families that fail are reported on standard error and skipped.
+    Return the number of families written.
+    """
+    jobs = [(filename, method, options) for filename in files]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    written = 0
+
+    f = sys.stdout if output == "-" else open(output, "w", newline="")
+    try:
+        if output.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(["file", "name", "gene_0", "gene_1", "gene_2",
+                             "trait_true", "trait_false"])
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for filename, probabilities, error in executor.map(
+                    infer_file, jobs, chunksize=chunksize):
+                if error is not None:
+                    print(f"Skipping {filename}: {error}", file=sys.stderr)
+                    continue
+                for person, distributions in probabilities.items():
+                    gene = distributions["gene"]
+                    trait = distributions["trait"]
+                    if output.endswith(".csv"):
+                        writer.writerow([filename, person,
+                                         gene[0], gene[1], gene[2],
+                                         trait[True], trait[False]])
+                    else:
+                        f.write(json.dumps({
+                            "file": filename,
+                            "name": person,
+                            "gene": {str(g): gene[g] for g in GENES},
+                            "trait": {"true": trait[True], "false": trait[False]}
+                        }) + "\n")
+                written += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return written
 
 
 def load_data(filename):
@@ -129,7 +759,8 @@ def powerset(s):
     ]
 
 
-def joint_probability(people: dict, one_gene:set, two_genes:set, have_trait:set):
+def joint_probability(people: dict, one_gene:set, two_genes:set, have_trait:set,
+                      log=False):
     """
     Compute and return a joint probability.
 
@@ -139,29 +770,68 @@ def joint_probability(people: dict, one_gene:set, two_genes:set, have_trait:set)
         * everyone not in `one_gene` or `two_gene` does not have the gene, and
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
+
+    If `log` is true, return the natural logarithm of the probability
+    instead, summed term by term so that it cannot underflow.
     """
-    
-    prob_dict = {}
-    for p in people.keys():
+    tables = cpt_tables(log)
+    inheritance = tables["inheritance"]
+    unconditional = tables["gene"]
+    trait = tables["trait"]
+
+    genes = {
+        p: 1 if p in one_gene else (2 if p in two_genes else 0)
+        for p in people
+    }
+
+    joint_prob = 0.0 if log else 1.0
+    for p, p_g in genes.items():
         mother = people[p]["mother"]
         father = people[p]["father"]
-        p_g = 1 if p in one_gene else (2 if p in two_genes else 0)
-        p_chance = 0
-        if(mother and father):
-            mother_g = 1 if mother in one_gene else (2 if mother in two_genes else 0)
-            father_g = 1 if father in one_gene else (2 if father in two_genes else 0)
-        
-            p_chance = prob_child_gene_count(p_g, mother_g, father_g) * PROBS["trait"][p_g][p in have_trait]
+        if mother and father:
+            p_chance = inheritance[p_g][genes[mother]][genes[father]]
         else:
-            p_chance = PROBS["gene"][p_g] * PROBS["trait"][p_g][p in have_trait]
+            p_chance = unconditional[p_g]
 
-        prob_dict[p] = p_chance
-
-    joint_prob = 1.0
-    for p in prob_dict:
-        joint_prob *= prob_dict[p]
+        if log:
+            joint_prob += p_chance + trait[p_g][p in have_trait]
+        else:
+            joint_prob *= p_chance * trait[p_g][p in have_trait]
     return joint_prob
 
+
+@functools.lru_cache(maxsize=None)
+def cpt_tables(log=False):
+    """
+    Return the conditional probability tables built from `PROBS`:
+        - `inheritance[child][mother][father]`, the probability of the
+          child's gene count given the parents' gene counts
+        - `gene[g]`, the probability of a parentless person having `g` genes
+        - `trait[g][t]`, the probability of trait `t` given `g` genes
+    Values are logarithms if `log` is true. Tables are built once, so
+    call `cpt_tables.cache_clear()` after changing `PROBS`.
+    """
+    def value(p):
+        if not log:
+            return p
+        return math.log(p) if p > 0 else -math.inf
+
+    return {
+        "inheritance": tuple(
+            tuple(
+                tuple(value(prob_child_gene_count(child, mother, father))
+                      for father in GENES)
+                for mother in GENES
+            )
+            for child in GENES
+        ),
+        "gene": tuple(value(PROBS["gene"][g]) for g in GENES),
+        "trait": tuple(
+            {t: value(PROBS["trait"][g][t]) for t in (False, True)}
+            for g in GENES
+        )
+    }
+
 def get_pass_probability(g):
     if g == 2:
         return 1 - PROBS["mutation"]
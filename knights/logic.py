@@ -15,6 +15,11 @@ class Sentence():
         """Returns a set of all symbols in the logical sentence."""
         return set()
 
+    def simplify(self, model=None):
+        """Returns an equivalent sentence with constants folded, given the
+        known symbol values in `model`."""
+        return self
+
     @classmethod
     def validate(cls, sentence):
         if not isinstance(sentence, Sentence):
@@ -42,6 +47,34 @@ class Sentence():
             return f"({s})"
 
 
+class Constant(Sentence):
+
+    def __init__(self, value):
+        self.value = bool(value)
+
+    def __eq__(self, other):
+        return isinstance(other, Constant) and self.value == other.value
+
+    def __hash__(self):
+        return hash(("constant", self.value))
+
+    def __repr__(self):
+        return "TRUE" if self.value else "FALSE"
+
+    def evaluate(self, model):
+        return self.value
+
+    def formula(self):
+        return "⊤" if self.value else "⊥"
+
+    def symbols(self):
+        return set()
+
+
+TRUE = Constant(True)
+FALSE = Constant(False)
+
+
 class Symbol(Sentence):
 
     def __init__(self, name):
@@ -68,6 +101,11 @@ class Symbol(Sentence):
     def symbols(self):
         return {self.name}
 
+    def simplify(self, model=None):
+        if model and self.name in model:
+            return TRUE if model[self.name] else FALSE
+        return self
+
 
 class Not(Sentence):
     def __init__(self, operand):
@@ -92,6 +130,14 @@ class Not(Sentence):
     def symbols(self):
         return self.operand.symbols()
 
+    def simplify(self, model=None):
+        operand = self.operand.simplify(model)
+        if isinstance(operand, Constant):
+            return FALSE if operand.value else TRUE
+        if isinstance(operand, Not):
+            return operand.operand
+        return Not(operand)
+
 
 class And(Sentence):
     def __init__(self, *conjuncts):
@@ -129,6 +175,16 @@ class And(Sentence):
     def symbols(self):
         return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
 
+    def simplify(self, model=None):
+        conjuncts = _fold_operands(And, self.conjuncts, model, FALSE)
+        if conjuncts is FALSE:
+            return FALSE
+        if not conjuncts:
+            return TRUE
+        if len(conjuncts) == 1:
+            return conjuncts[0]
+        return And(*conjuncts)
+
 
 class Or(Sentence):
     def __init__(self, *disjuncts):
@@ -160,6 +216,16 @@ class Or(Sentence):
     def symbols(self):
         return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
 
+    def simplify(self, model=None):
+        disjuncts = _fold_operands(Or, self.disjuncts, model, TRUE)
+        if disjuncts is TRUE:
+            return TRUE
+        if not disjuncts:
+            return FALSE
+        if len(disjuncts) == 1:
+            return disjuncts[0]
+        return Or(*disjuncts)
+
 
 class Implication(Sentence):
     def __init__(self, antecedent, consequent):
@@ -191,6 +257,17 @@ class Implication(Sentence):
     def symbols(self):
         return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
+    def simplify(self, model=None):
+        antecedent = self.antecedent.simplify(model)
+        consequent = self.consequent.simplify(model)
+        if isinstance(antecedent, Constant):
+            return consequent if antecedent.value else TRUE
+        if isinstance(consequent, Constant):
+            return TRUE if consequent.value else Not(antecedent).simplify()
+        if antecedent == consequent:
+            return TRUE
+        return Implication(antecedent, consequent)
+
 
 class Biconditional(Sentence):
     def __init__(self, left, right):
@@ -224,9 +301,88 @@ class Biconditional(Sentence):
     def symbols(self):
         return set.union(self.left.symbols(), self.right.symbols())
 
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def simplify(self, model=None):
+        left = self.left.simplify(model)
+        right = self.right.simplify(model)
+        if isinstance(left, Constant):
+            left, right = right, left
+        if isinstance(right, Constant):
+            return left if right.value else Not(left).simplify()
+        if left == right:
+            return TRUE
+        return Biconditional(left, right)
+
+
+def _fold_operands(cls, operands, model, absorbing):
+    """
+    Simplifies the operands of an And or Or sentence `cls`.
+    Nested sentences of the same kind are flattened, duplicates and
+    identity constants are dropped. Returns `absorbing` if the whole
+    sentence collapses to it (including when an operand appears
+    alongside its negation), otherwise a list of remaining operands.
+    """
+    result = []
+    seen = set()
+    for operand in operands:
+        operand = operand.simplify(model)
+        nested = (operand.conjuncts if cls is And else operand.disjuncts) \
+            if isinstance(operand, cls) else [operand]
+        for item in nested:
+            if isinstance(item, Constant):
+                if item == absorbing:
+                    return absorbing
+                continue
+            if item in seen:
+                continue
+            if Not(item).simplify() in seen:
+                return absorbing
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def literal(sentence):
+    """
+    Returns a `(name, value)` pair if the sentence is a single symbol
+    or a negated symbol, None otherwise.
+    """
+    if isinstance(sentence, Symbol):
+        return sentence.name, True
+    if isinstance(sentence, Not) and isinstance(sentence.operand, Symbol):
+        return sentence.operand.name, False
+    return None
+
+
+def simplify_knowledge(knowledge):
+    """
+    Simplifies a knowledge base by folding constants and repeatedly
+    propagating facts that are asserted directly as conjuncts.
+    Returns a tuple `(knowledge, facts)` where `facts` maps symbol names
+    to their forced values; those symbols no longer appear in `knowledge`.
+    """
+    facts = dict()
+    knowledge = knowledge.simplify()
+    while True:
+        conjuncts = (knowledge.conjuncts if isinstance(knowledge, And)
+                     else [knowledge])
+        units = dict()
+        for conjunct in conjuncts:
+            unit = literal(conjunct)
+            if unit is not None:
+                name, value = unit
+                units[name] = value
+        if not units:
+            return knowledge, facts
+        facts.update(units)
+        knowledge = knowledge.simplify(facts)
+
+
+def model_check(knowledge, query, simplify=False):
+    """
+    Checks if knowledge base entails query.
+    If `simplify` is True, the knowledge base is simplified first so
+    that only symbols not already forced by known facts are enumerated.
+    """
 
     def check_all(knowledge, query, symbols, model):
         """Checks if knowledge base entails query, given a particular model."""
@@ -256,8 +412,17 @@ def model_check(knowledge, query):
             return (check_all(knowledge, query, remaining, model_true) and
                     check_all(knowledge, query, remaining, model_false))
 
+    model = dict()
+    if simplify:
+
+        # Knowledge that is contradictory entails everything
+        knowledge, model = simplify_knowledge(knowledge)
+        if knowledge == FALSE:
+            return True
+        query = query.simplify(model)
+
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = set.union(knowledge.symbols(), query.symbols()) - set(model)
 
     # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    return check_all(knowledge, query, symbols, model)
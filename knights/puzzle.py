@@ -142,7 +142,7 @@ def main():
             print("    Not yet implemented.")
         else:
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if model_check(knowledge, symbol, simplify=True):
                     print(f"    {symbol}")
 
 
@@ -0,0 +1,149 @@
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games headlessly with the AI."
+    )
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--mines", type=int, default=None,
+                        help="number of mines (overrides --density)")
+    parser.add_argument("--density", type=float, default=0.125,
+                        help="fraction of cells that are mines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to play games in")
+    parser.add_argument("--probabilistic", action="store_true",
+                        help="guess the lowest-risk cell instead of a random one")
+    parser.add_argument("--linear", action="store_true",
+                        help="also solve knowledge by Gaussian elimination")
+    args = parser.parse_args()
+
+    mines = args.mines
+    if mines is None:
+        mines = round(args.height * args.width * args.density)
+
+    results = tournament(
+        args.games, args.height, args.width, mines,
+        seed=args.seed, workers=args.workers,
+        probabilistic=args.probabilistic, linear=args.linear
+    )
+    report(results, args.height, args.width, mines)
+
+
+def play_game(height, width, mines, seed, probabilistic=False, linear=False):
+    """
+    Play one game without a display and return a dictionary describing it:
+        - `won`: whether every safe cell was revealed
+        - `moves`: number of moves made
+        - `revealed`: number of cells revealed, including cascades
+        - `guesses`: number of moves that were not known to be safe
+        - `thinking`: seconds the AI spent on each move, choosing it
+          and then adding what it revealed to the knowledge base
+        - `elapsed`: seconds spent playing the whole game
+    """
+    random.seed(seed)
+    start = time.perf_counter()
+    game = Minesweeper(height=height, width=width, mines=mines,
+                       rng=np.random.default_rng(seed))
+    ai = MinesweeperAI(height=height, width=width,
+                       probabilistic=probabilistic, total_mines=mines,
+                       linear=linear)
+
+    guesses = 0
+    thinking = []
+    won = False
+    while True:
+        before = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+            if move is None:
+                won = True
+                break
+            guesses += 1
+        choosing = time.perf_counter() - before
+
+        if game.is_mine(move):
+            thinking.append(choosing)
+            break
+
+        observations = game.reveal(move, ai.moves_made)
+        before = time.perf_counter()
+        ai.add_knowledge_batch(observations)
+        thinking.append(choosing + time.perf_counter() - before)
+
+        if len(ai.moves_made) == height * width - mines:
+            won = True
+            break
+
+    return {
+        "won": won,
+        "moves": len(thinking),
+        "revealed": len(ai.moves_made),
+        "guesses": guesses,
+        "thinking": thinking,
+        "elapsed": time.perf_counter() - start
+    }
+
+
+def _play(arguments):
+    return play_game(*arguments)
+
+
+def tournament(n, height, width, mines, seed=0, workers=1,
+               probabilistic=False, linear=False):
+    """
+    Play `n` games, game `i` seeded with `seed + i`, and return
+    the list of results from `play_game`. Games are spread across
+    `workers` processes if more than one is requested.
+    """
+    games = [
+        (height, width, mines, seed + i, probabilistic, linear)
+        for i in range(n)
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_play, games, chunksize=max(1, n // (workers * 4))))
+    return [_play(game) for game in games]
+
+
+def report(results, height, width, mines):
+    """
+    Print win rate and timing statistics for a list of game results.
+    """
+    games = len(results)
+    wins = sum(result["won"] for result in results)
+    moves = sum(result["moves"] for result in results)
+    revealed = sum(result["revealed"] for result in results)
+    guesses = sum(result["guesses"] for result in results)
+    elapsed = sum(result["elapsed"] for result in results)
+    thinking = sorted(
+        seconds for result in results for seconds in result["thinking"]
+    )
+
+    print(f"Board {height}x{width} with {mines} mines, {games} games")
+    print(f"  Win rate: {wins / games:.2%} ({wins}/{games})")
+    print(f"  Moves per game: {moves / games:.1f} "
+          f"({revealed / games:.1f} cells revealed)")
+    print(f"  Guesses per game: {guesses / games:.2f}")
+    print(f"  Moves per second: {moves / elapsed:.0f}")
+    if thinking:
+        p99 = thinking[min(len(thinking) - 1, int(len(thinking) * 0.99))]
+        print(f"  Thinking per move: {statistics.mean(thinking) * 1000:.3f} ms "
+              f"(median {statistics.median(thinking) * 1000:.3f} ms, "
+              f"p99 {p99 * 1000:.3f} ms, max {thinking[-1] * 1000:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
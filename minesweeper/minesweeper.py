@@ -1,5 +1,19 @@
 import itertools
+import logging
+import math
 import random
+from collections import Counter, deque
+
+import numpy as np
+
+# Tracing is silent unless the application configures this logger
+logger = logging.getLogger(__name__)
+
+# Largest frontier component whose mine configurations are enumerated
+MAX_COMPONENT_CELLS = 48
+
+# Random number generator for placing mines when a game is not given one
+RNG = np.random.default_rng()
 
 
 class Minesweeper():
@@ -7,32 +21,40 @@ class Minesweeper():
     Minesweeper game representation
     """
 
-    def __init__(self, height=8, width=8, mines=8):
+    def __init__(self, height=8, width=8, mines=8, rng=None):
 
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
-
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly, sampling distinct cells with `rng`, into
+        # a field with a border of one empty cell on every side
+        if rng is None:
+            rng = RNG
+        positions = rng.choice(height * width, mines, replace=False)
+        padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1].flat[positions] = 1
+        self.board = padded[1:-1, 1:-1].astype(bool)
+        self._mines = None
+
+        # Count neighboring mines of every cell at once, summing each
+        # 3x3 block along rows, then columns, then leaving out the cell
+        rows = padded[:, :-2] + padded[:, 1:-1] + padded[:, 2:]
+        self.counts = rows[:-2] + rows[1:-1] + rows[2:] - padded[1:-1, 1:-1]
 
         # At first, player has found no mines
         self.mines_found = set()
 
+    @property
+    def mines(self):
+        """
+        The set of cells that contain mines.
+        """
+        if self._mines is None:
+            rows, columns = np.nonzero(self.board)
+            self._mines = set(zip(rows.tolist(), columns.tolist()))
+        return self._mines
+
     def print(self):
         """
         Prints a text-based representation
@@ -50,7 +72,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +80,39 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        i, j = cell
+        return int(self.counts[i, j])
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+    def reveal(self, cell, revealed=frozenset()):
+        """
+        Reveals safe cell `cell`, and if it has no neighboring mines,
+        keeps revealing outward through every connected cell that also
+        has none, along with the border of that region.
+        Cells in `revealed` are skipped.
 
-        return count
+        Returns a list of `(cell, count)` pairs for each newly revealed
+        cell, where `count` is its number of neighboring mines.
+        """
+        observations = []
+        seen = {cell}
+        queue = deque([cell])
+        while queue:
+            i, j = queue.popleft()
+            count = int(self.counts[i, j])
+            if (i, j) not in revealed:
+                observations.append(((i, j), count))
+            if count:
+                continue
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    neighbor = (i + di, j + dj)
+                    if (0 <= neighbor[0] < self.height
+                            and 0 <= neighbor[1] < self.width
+                            and neighbor not in seen
+                            and neighbor not in revealed):
+                        seen.add(neighbor)
+                        queue.append(neighbor)
+        return observations
 
     def won(self):
         """
@@ -89,17 +126,27 @@ class Sentence():
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+    Sentences are immutable and hashable, so marking a cell
+    returns a new sentence instead of changing this one.
     """
 
+    __slots__ = ("cells", "count")
+
     def __init__(self, cells, count):
-        self.cells = set(cells)
-        self.count = count
+        object.__setattr__(self, "cells", frozenset(cells))
+        object.__setattr__(self, "count", count)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Sentence is immutable")
 
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash((self.cells, self.count))
+
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{set(self.cells)} = {self.count}"
 
     def known_mines(self):
         """
@@ -108,8 +155,7 @@ class Sentence():
         if(len(self.cells) == self.count):
             return self.cells
         else:
-            return set()
-        
+            return frozenset()
 
     def known_safes(self):
         """
@@ -118,25 +164,83 @@ class Sentence():
         if(self.count == 0):
             return self.cells
         else:
-            return set()
+            return frozenset()
 
     def mark_mine(self, cell):
         """
-        Updates internal knowledge representation given the fact that
+        Returns the sentence that remains given the fact that
         a cell is known to be a mine.
         """
         if(cell in self.cells):
-            self.cells.remove(cell)
-            self.count -= 1
-        
+            return Sentence(self.cells - {cell}, self.count - 1)
+        return self
 
     def mark_safe(self, cell):
         """
-        Updates internal knowledge representation given the fact that
+        Returns the sentence that remains given the fact that
         a cell is known to be safe.
         """
         if(cell in self.cells):
-            self.cells.remove(cell)
+            return Sentence(self.cells - {cell}, self.count)
+        return self
+
+
+def eliminate(sentences):
+    """
+    Reduces `sentences` to row echelon form with integer row operations
+    and applies bound reasoning to every reduced row, where each cell is
+    either 0 (safe) or 1 (mine).
+    Returns a tuple `(mines, safes)` of the cells that are determined.
+    """
+    rows = [
+        ({cell: 1 for cell in sentence.cells}, sentence.count)
+        for sentence in sentences
+    ]
+    cells = sorted(set().union(*(sentence.cells for sentence in sentences)))
+
+    pivot = 0
+    for cell in cells:
+        for r in range(pivot, len(rows)):
+            if cell in rows[r][0]:
+                break
+        else:
+            continue
+        rows[pivot], rows[r] = rows[r], rows[pivot]
+        pivot_coefficients, pivot_value = rows[pivot]
+        a = pivot_coefficients[cell]
+
+        for r in range(len(rows)):
+            coefficients, value = rows[r]
+            if r == pivot or cell not in coefficients:
+                continue
+            b = coefficients[cell]
+            combined = {
+                c: coefficients.get(c, 0) * a - pivot_coefficients.get(c, 0) * b
+                for c in coefficients.keys() | pivot_coefficients.keys()
+            }
+            combined = {c: v for c, v in combined.items() if v}
+            value = value * a - pivot_value * b
+            divisor = math.gcd(value, *combined.values())
+            if divisor > 1:
+                combined = {c: v // divisor for c, v in combined.items()}
+                value //= divisor
+            rows[r] = (combined, value)
+        pivot += 1
+
+    mines = set()
+    safes = set()
+    for coefficients, value in rows:
+        if not coefficients:
+            continue
+        low = sum(v for v in coefficients.values() if v < 0)
+        high = sum(v for v in coefficients.values() if v > 0)
+        if value == low:
+            mines |= {c for c, v in coefficients.items() if v < 0}
+            safes |= {c for c, v in coefficients.items() if v > 0}
+        elif value == high:
+            mines |= {c for c, v in coefficients.items() if v > 0}
+            safes |= {c for c, v in coefficients.items() if v < 0}
+    return mines, safes
 
 
 class MinesweeperAI():
@@ -144,12 +248,29 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, counters=False,
+                 probabilistic=False, total_mines=None, linear=False):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Guess the lowest-risk cell instead of a random one, weighting
+        # configurations by the total number of mines if it is known
+        self.probabilistic = probabilistic
+        self.total_mines = total_mines
+
+        # Enumerated configurations of each frontier component
+        self.solutions = dict()
+
+        # Also solve knowledge as a linear system when subset inference
+        # runs out, skipping components that already yielded nothing
+        self.linear = linear
+        self.eliminated = set()
+
+        # Optionally count sentences, inferences and iterations
+        self.counters = Counter() if counters else None
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -157,8 +278,15 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge: list[Sentence] = []
+        # Set of sentences about the game known to be true,
+        # never containing empty sentences
+        self.knowledge: set[Sentence] = set()
+
+        # Map each cell to the sentences that mention it
+        self.index: dict[tuple, set[Sentence]] = dict()
+
+        # Sentences that changed and still need to be examined
+        self.pending: deque[Sentence] = deque()
 
     def mark_mine(self, cell):
         """
@@ -166,8 +294,9 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        for sentence in self.index.pop(cell, ()):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.mark_mine(cell))
 
     def mark_safe(self, cell):
         """
@@ -175,8 +304,118 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        for sentence in self.index.pop(cell, ()):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.mark_safe(cell))
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base unless it is empty or
+        already known, and queues it for inference.
+        """
+        if not sentence.cells or sentence in self.knowledge:
+            return
+        self.knowledge.add(sentence)
+        self.count("sentences")
+        for cell in sentence.cells:
+            self.index.setdefault(cell, set()).add(sentence)
+        self.pending.append(sentence)
+
+    def remove_sentence(self, sentence):
+        """
+        Removes a sentence from the knowledge base and the cell index.
+        """
+        self.knowledge.discard(sentence)
+        for cell in sentence.cells:
+            sentences = self.index.get(cell)
+            if sentences is not None:
+                sentences.discard(sentence)
+                if not sentences:
+                    del self.index[cell]
+
+    def count(self, name):
+        """
+        Increments counter `name` if counters are enabled.
+        """
+        if self.counters is not None:
+            self.counters[name] += 1
+
+    def related(self, sentence):
+        """
+        Returns the sentences that share at least one cell with `sentence`.
+        """
+        related = set()
+        for cell in sentence.cells:
+            related |= self.index.get(cell, set())
+        related.discard(sentence)
+        return related
+
+    def infer(self):
+        """
+        Examines every pending sentence until no more changes occur.
+        A sentence that pins down its cells marks them as safe or as
+        mines; otherwise it is compared against the sentences it shares
+        cells with, and subset differences are added as new sentences.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
+            self.count("iterations")
+            if sentence not in self.knowledge:
+                continue
+
+            mines = sentence.known_mines()
+            safes = sentence.known_safes()
+            if mines or safes:
+                for cell in mines:
+                    self.mark_mine(cell)
+                for cell in safes:
+                    self.mark_safe(cell)
+                continue
+
+            for other in self.related(sentence):
+                if sentence.cells < other.cells:
+                    inferred = Sentence(other.cells - sentence.cells, other.count - sentence.count)
+                elif other.cells < sentence.cells:
+                    inferred = Sentence(sentence.cells - other.cells, sentence.count - other.count)
+                else:
+                    continue
+                if inferred.count >= 0:
+                    self.count("inferences")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("inferred %s", inferred)
+                    self.add_sentence(inferred)
+
+    def solve_linear(self):
+        """
+        Treats each changed component of the knowledge base as a linear
+        system over its cells and reduces it by Gaussian elimination.
+        A reduced row whose right-hand side equals the smallest or largest
+        value its coefficients allow pins down all of its cells.
+        Marks those cells and returns True if any were found.
+        """
+        components = self.components()
+        eliminated = set()
+        mines = set()
+        safes = set()
+        for component in components:
+            if component in self.eliminated:
+                eliminated.add(component)
+                continue
+            self.count("eliminations")
+            found_mines, found_safes = eliminate(component)
+            if not found_mines and not found_safes:
+                eliminated.add(component)
+            mines |= found_mines
+            safes |= found_safes
+        self.eliminated = eliminated
+
+        for cell in mines:
+            self.mark_mine(cell)
+        for cell in safes:
+            self.mark_safe(cell)
+        if logger.isEnabledFor(logging.DEBUG) and (mines or safes):
+            logger.debug("elimination found mines %s, safes %s", mines, safes)
+        return bool(mines or safes)
 
     def add_knowledge(self, cell, count):
         """
@@ -193,6 +432,25 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
+        self.observe(cell, count)
+        self.update()
+
+    def add_knowledge_batch(self, observations):
+        """
+        Adds knowledge for every `(cell, count)` pair in `observations`,
+        such as the cells uncovered by `Minesweeper.reveal`, then runs
+        inference once for the whole batch.
+        """
+        for cell, count in observations:
+            self.observe(cell, count)
+        self.update()
+
+    def observe(self, cell, count):
+        """
+        Marks `cell` as a safe move that has been made and adds the
+        sentence given by its `count` of neighboring mines,
+        without running inference.
+        """
         self.moves_made.add(cell)
         self.mark_safe(cell)
 
@@ -201,84 +459,35 @@ class MinesweeperAI():
         min_j = max(0, cell[1] - 1)
         max_j = min(self.width - 1, cell[1] + 1)
 
-
-       
-        print("i:", (min_i, max_i + 1))
-        print("j:", (min_j, max_j + 1))
         sentence_cells = set()
         for i in range(min_i, max_i + 1):
             for j in range(min_j, max_j + 1):
                 check_cell = (i, j)
-                print("looking at:", check_cell)
                 if not check_cell in self.moves_made and not check_cell in self.safes:
                     if not check_cell in self.mines:
                         sentence_cells.add(check_cell)
                     else:
                         count -= 1
 
-        
         new_sentence = Sentence(sentence_cells, count)
-        print("inferred:", new_sentence)
-
-        self.knowledge.append(new_sentence)
-
-
-        while True:
-            inferred_sentences = []
-            new_safes = set()
-            new_mines = set()
-
-            for sentence in self.knowledge:
-                new_safes |= sentence.known_safes()
-                new_mines |= sentence.known_mines()
-
-            for cell in new_safes:
-                self.mark_safe(cell)
-            for cell in new_mines:
-                self.mark_mine(cell)
-
-            for sentence in self.knowledge:
-                for sentence2 in self.knowledge:
-                    if sentence == sentence2:
-                        continue
-                    if sentence.cells.issubset(sentence2.cells):
-                        inferred = Sentence(sentence2.cells - sentence.cells, sentence2.count - sentence.count)
-                        if inferred not in self.knowledge and len(inferred.cells) > 0 and inferred.count >= 0:
-                            inferred_sentences.append(inferred)
-                    elif sentence2.cells.issubset(sentence.cells):
-                        inferred = Sentence(sentence.cells - sentence2.cells, sentence.count - sentence2.count)
-                        if inferred not in self.knowledge and len(inferred.cells) > 0 and inferred.count >= 0:
-                            inferred_sentences.append(inferred)
-
-           
-                        
-            if(inferred_sentences):
-                self.knowledge.extend(inferred_sentences)
-            else:
-                for sentence in self.knowledge:
-                    new_safes |= sentence.known_safes()
-                    new_mines |= sentence.known_mines()
-
-                for cell in new_safes:
-                    self.mark_safe(cell)
-                for cell in new_mines:
-                    self.mark_mine(cell)
-                    
-                break
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("observed %s: %s", cell, new_sentence)
 
-        
-        
-        
+        self.add_sentence(new_sentence)
 
-        print("knows: ")
-        for s in self.knowledge:
-            print(s, end=", ")
-        print()
+    def update(self):
+        """
+        Draws every conclusion available from pending knowledge.
+        """
+        self.infer()
+        while self.linear and self.solve_linear():
+            self.infer()
 
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("knowledge: %s", ", ".join(str(s) for s in self.knowledge))
+            logger.debug("mines: %s", self.mines)
+            logger.debug("safes: %s", self.safes - self.moves_made)
 
-        print("bombs:", self.mines)
-        print("safe:", self.safes)
-        
     def make_safe_move(self):
         """
         Returns a safe cell to choose on the Minesweeper board.
@@ -290,7 +499,6 @@ class MinesweeperAI():
         """
         safe_not_made_moves = self.safes - self.moves_made
         if(len(safe_not_made_moves) > 0):
-            print(safe_not_made_moves)
             s = safe_not_made_moves.pop()
             return s
         else:
@@ -302,13 +510,222 @@ class MinesweeperAI():
         Should choose randomly among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        If the AI is probabilistic, the cell least likely
+        to be a mine is chosen instead.
         """
-        bad_moves = self.moves_made | self.mines
-        rand_move = (random.randint(0, self.height - 1), random.randint(0, self.width - 1))
+        if self.probabilistic:
+            return self.make_probable_move()
+
+        candidates = [
+            (i, j)
+            for i in range(self.height)
+            for j in range(self.width)
+            if (i, j) not in self.moves_made and (i, j) not in self.mines
+        ]
+        if not candidates:
+            return None
+        return random.choice(candidates)
 
-        while(rand_move in bad_moves):
-             if(self.height * self.width - len(self.mines) == len(self.moves_made)):
-                 return None
-             rand_move = (random.randint(0, self.height - 1), random.randint(0, self.width - 1))
+    def make_probable_move(self):
+        """
+        Returns the unplayed cell least likely to be a mine,
+        choosing randomly among ties, or None if there are no moves left.
+        """
+        probabilities = self.mine_probabilities()
+        if not probabilities:
+            return None
+        lowest = min(probabilities.values())
+        return random.choice([
+            cell for cell, p in probabilities.items() if p == lowest
+        ])
+
+    def components(self):
+        """
+        Splits the knowledge base into groups of sentences that share
+        cells, directly or through other sentences. Configurations of
+        different groups can be enumerated independently.
+        """
+        parent = dict()
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for cell in self.index:
+            parent[cell] = cell
+        for sentence in self.knowledge:
+            cells = iter(sentence.cells)
+            root = find(next(cells))
+            for cell in cells:
+                parent[find(cell)] = root
+
+        groups = dict()
+        for sentence in self.knowledge:
+            root = find(next(iter(sentence.cells)))
+            groups.setdefault(root, set()).add(sentence)
+        return [frozenset(group) for group in groups.values()]
+
+    def solve_component(self, sentences):
+        """
+        Enumerates all mine configurations of the cells in `sentences`
+        that satisfy every sentence.
+
+        Returns a tuple `(cells, ways, hits)` where `ways[k]` is the number
+        of configurations with `k` mines and `hits[k][n]` is how many of
+        those place a mine on `cells[n]`. Returns None if the component is
+        too large to enumerate.
+        """
+        sentences = list(sentences)
+
+        # Order cells so that each sentence is completed as early as possible
+        cells = []
+        seen = set()
+        for sentence in sorted(sentences, key=lambda s: len(s.cells)):
+            for cell in sorted(sentence.cells):
+                if cell not in seen:
+                    seen.add(cell)
+                    cells.append(cell)
+        if len(cells) > MAX_COMPONENT_CELLS:
+            return None
+
+        links = [
+            [n for n, sentence in enumerate(sentences) if cell in sentence.cells]
+            for cell in cells
+        ]
+        need = [sentence.count for sentence in sentences]
+        left = [len(sentence.cells) for sentence in sentences]
+        assignment = [0] * len(cells)
+        ways = Counter()
+        hits = dict()
+
+        def backtrack(i, k):
+            if i == len(cells):
+                ways[k] += 1
+                row = hits.setdefault(k, [0] * len(cells))
+                for n, value in enumerate(assignment):
+                    row[n] += value
+                return
+            for value in (0, 1):
+                consistent = True
+                for n in links[i]:
+                    left[n] -= 1
+                    need[n] -= value
+                    if need[n] < 0 or need[n] > left[n]:
+                        consistent = False
+                if consistent:
+                    assignment[i] = value
+                    backtrack(i + 1, k + value)
+                for n in links[i]:
+                    left[n] += 1
+                    need[n] += value
+            assignment[i] = 0
+
+        backtrack(0, 0)
+        return cells, ways, hits
+
+    def mine_probabilities(self):
+        """
+        Returns a dictionary mapping every unplayed cell not known to be
+        a mine to the probability that it is a mine, given the knowledge
+        base and, if known, the total number of mines on the board.
+        """
+        probabilities = dict()
+        unknown = set()
+        for i in range(self.height):
+            for j in range(self.width):
+                cell = (i, j)
+                if cell in self.moves_made or cell in self.mines:
+                    continue
+                if cell in self.safes:
+                    probabilities[cell] = 0
+                elif cell not in self.index:
+                    unknown.add(cell)
+
+        # Enumerate each component, reusing results for unchanged ones
+        solutions = dict()
+        for component in self.components():
+            solution = self.solutions.get(component)
+            if solution is None:
+                solution = self.solve_component(component)
+            solutions[component] = solution
+        self.solutions = solutions
+
+        solved = []
+        for component, solution in solutions.items():
+            if solution is None or not solution[1]:
+
+                # Too large to enumerate, so estimate from each sentence
+                for sentence in component:
+                    for cell in sentence.cells:
+                        p = sentence.count / len(sentence.cells)
+                        probabilities[cell] = max(p, probabilities.get(cell, 0))
+            else:
+                solved.append(solution)
+
+        remaining = None
+        if self.total_mines is not None:
+            remaining = self.total_mines - len(self.mines)
+
+        # Combine components through the number of mines left elsewhere
+        def interior(k):
+            """Ways to place the mines not used by `k` frontier mines."""
+            if 0 <= remaining - k <= len(unknown):
+                return math.comb(len(unknown), remaining - k)
+            return 0
+
+        def convolve(distributions):
+            total = {0: 1}
+            for distribution in distributions:
+                combined = Counter()
+                for a, x in total.items():
+                    for b, y in distribution.items():
+                        combined[a + b] += x * y
+                total = combined
+            return total
+
+        if remaining is not None:
+            total = {
+                k: count * interior(k)
+                for k, count in convolve(ways for _, ways, _ in solved).items()
+            }
+            if not sum(total.values()):
+                remaining = None
+
+        for n, (cells, ways, hits) in enumerate(solved):
+            if remaining is None:
+                configurations = sum(ways.values())
+                for m, cell in enumerate(cells):
+                    mined = sum(row[m] for row in hits.values())
+                    probabilities[cell] = mined / configurations
+                continue
+
+            others = convolve(
+                solution[1] for o, solution in enumerate(solved) if o != n
+            )
+            mined = [0] * len(cells)
+            configurations = 0
+            for a, count in ways.items():
+                scale = sum(y * interior(a + b) for b, y in others.items())
+                configurations += count * scale
+                for m in range(len(cells)):
+                    mined[m] += hits[a][m] * scale
+            for m, cell in enumerate(cells):
+                probabilities[cell] = mined[m] / configurations
+
+        # Cells away from the frontier share the mines left over
+        if unknown:
+            if remaining is not None:
+                expected = sum(
+                    count * (remaining - k) for k, count in total.items()
+                ) / sum(total.values())
+                p = expected / len(unknown)
+            elif probabilities:
+                p = sum(probabilities.values()) / len(probabilities)
+            else:
+                p = 0.5
+            for cell in unknown:
+                probabilities[cell] = p
 
-        return rand_move
+        return probabilities
@@ -1,6 +1,14 @@
+import functools
+import itertools
 import math
+import os
 import random
+import struct
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 
 class Nim():
@@ -70,21 +78,201 @@ class Nim():
             self.winner = self.player
 
 
+# Saved Q-tables start with this header, followed by the initial pile
+# sizes as unsigned 32-bit integers and then the Q-values as float64,
+# aligned to 8 bytes so the table can be memory-mapped
+MAGIC = b"NIMQ"
+VERSION = 2
+HEADER = struct.Struct("<4sHHddQ?")
+
+
 class NimAI():
 
-    def __init__(self, alpha=0.5, epsilon=0.1):
+    def __init__(self, alpha=0.5, epsilon=0.1, initial=[1, 3, 5, 7],
+                 symmetric=False, q=None):
         """
-        Initialize AI with an empty Q-learning dictionary,
+        Initialize AI with an empty Q-learning table,
         an alpha (learning) rate, and an epsilon rate.
 
-        The Q-learning dictionary maps `(state, action)`
-        pairs to a Q-value (a number).
-         - `state` is a tuple of remaining piles, e.g. (1, 1, 4, 4)
-         - `action` is a tuple `(i, j)` for an action
+        The Q-learning table is a dense array of Q-values with one row
+        per state and one column per action, for games starting from
+        piles `initial`.
+         - `state` is a list of remaining piles, e.g. [1, 1, 4, 4],
+           stored at the row given by `encode(state)`
+         - `action` is a tuple `(i, j)` for an action,
+           stored at the column given by `encode_action(state, action)`
+
+        If `symmetric` is True, states that are reorderings of each other
+        share a row: states are stored with their piles sorted, and
+        actions refer to piles in that sorted order.
+
+        If `q` is given, it is used as the Q-table instead of an empty one.
         """
-        self.q = dict()
         self.alpha = alpha
         self.epsilon = epsilon
+        self.initial = list(initial)
+        self.symmetric = symmetric
+        self.games = 0
+
+        # Sorting piles never takes a state outside the sorted initial piles
+        shape = sorted(self.initial) if symmetric else self.initial
+        dtype = np.min_scalar_type(max(shape, default=0))
+
+        # States are numbered in mixed radix, pile i having digit state[i],
+        # or by position among the sorted states if symmetric
+        self.strides = []
+        stride = 1
+        for pile in reversed(shape):
+            self.strides.insert(0, stride)
+            stride *= pile + 1
+        if symmetric:
+            states = sorted_states(shape)
+            self.rows = {state: n for n, state in enumerate(states)}
+            digits = np.array(states, dtype=dtype).reshape(len(states), len(shape))
+        else:
+            digits = np.indices([pile + 1 for pile in shape], dtype=dtype)
+            digits = digits.reshape(len(shape), -1).T
+
+        # Every action that is possible from some state
+        self.actions = [
+            (i, j)
+            for i, pile in enumerate(shape)
+            for j in range(1, pile + 1)
+        ]
+        self.action_index = {
+            action: n for n, action in enumerate(self.actions)
+        }
+
+        # Which actions are available in each state; the columns of a
+        # state's actions are only listed once they are needed
+        piles = np.array([i for i, _ in self.actions], dtype=int)
+        counts = np.array([j for _, j in self.actions], dtype=dtype)
+        self.valid = counts <= digits[:, piles]
+        self.columns = dict()
+
+        if q is None:
+            q = np.zeros(self.valid.shape)
+        elif q.shape != self.valid.shape:
+            raise Exception(f"Q-table has shape {q.shape}, expected {self.valid.shape}")
+        self.q = q
+
+    def available(self, s):
+        """
+        Return the columns of the actions available in row `s`.
+        """
+        columns = self.columns.get(s)
+        if columns is None:
+            columns = self.columns[s] = np.flatnonzero(self.valid[s])
+        return columns
+
+    @property
+    def q(self):
+        """
+        The Q-table. Assigning a new table discards the greedy policy.
+        """
+        return self._q
+
+    @q.setter
+    def q(self, q):
+        self._q = q
+        self.policy = None
+
+    def greedy_policy(self):
+        """
+        Return an array holding the column of the best action in every
+        state, computing it only if the Q-table changed since last time.
+        States without actions hold -1.
+        """
+        if self.policy is None:
+            masked = np.where(self.valid, self._q, -np.inf)
+            self.policy = np.where(self.valid.any(axis=1), masked.argmax(axis=1), -1)
+        return self.policy
+
+    def save(self, filename):
+        """
+        Save the Q-table and training parameters to `filename`.
+        The file is written in full before replacing any existing one,
+        which may be the file this AI's Q-table was loaded from.
+        """
+        header = HEADER.pack(MAGIC, VERSION, len(self.initial),
+                             self.alpha, self.epsilon, self.games,
+                             self.symmetric)
+        piles = struct.pack(f"<{len(self.initial)}I", *self.initial)
+        padding = -(len(header) + len(piles)) % 8
+        temporary = f"{filename}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(header + piles + bytes(padding))
+                f.write(np.ascontiguousarray(self.q, dtype="<f8").tobytes())
+            os.replace(temporary, filename)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """
+        Load an AI saved with `save`. If `mmap` is True, the Q-table is
+        memory-mapped copy-on-write rather than read into memory, so
+        further training never changes the file.
+        """
+        with open(filename, "rb") as f:
+            header = f.read(HEADER.size)
+            if header[:len(MAGIC)] != MAGIC:
+                raise Exception("Not a saved Nim AI")
+            version = struct.unpack_from("<H", header, len(MAGIC))[0]
+            if version != VERSION:
+                raise Exception(f"Unsupported Nim AI version {version}")
+            _, _, count, alpha, epsilon, games, symmetric = HEADER.unpack(header)
+            initial = list(struct.unpack(f"<{count}I", f.read(4 * count)))
+
+        # There is one column for every pile size an action can remove
+        offset = HEADER.size + 4 * count
+        offset += -offset % 8
+        if mmap:
+            q = np.memmap(filename, dtype="<f8", mode="c", offset=offset)
+        else:
+            q = np.fromfile(filename, dtype="<f8", offset=offset)
+        q = q.reshape(-1, sum(initial))
+
+        ai = cls(alpha=alpha, epsilon=epsilon, initial=initial,
+                 symmetric=symmetric, q=q)
+        ai.games = games
+        return ai
+
+    def encode(self, state):
+        """
+        Return the row of the Q-table for state `state`.
+        """
+        if self.symmetric:
+            return self.rows[tuple(sorted(state))]
+        return sum(pile * stride for pile, stride in zip(state, self.strides))
+
+    def order(self, state):
+        """
+        Return the pile indices of `state` in the order the Q-table
+        stores them.
+        """
+        if self.symmetric:
+            return sorted(range(len(state)), key=state.__getitem__)
+        return range(len(state))
+
+    def encode_action(self, state, action):
+        """
+        Return the column of the Q-table for action `action` in `state`.
+        """
+        i, j = action
+        if self.symmetric:
+            i = self.order(state).index(i)
+        return self.action_index[(i, j)]
+
+    def decode_action(self, state, column):
+        """
+        Return the action in `state` stored at column `column`.
+        """
+        i, j = self.actions[column]
+        return (self.order(state)[i], j)
 
     def update(self, old_state, action, new_state, reward):
         """
@@ -96,12 +284,27 @@ class NimAI():
         best_future = self.best_future_reward(new_state)
         self.update_q_value(old_state, action, old, reward, best_future)
 
+    def update_batch(self, transitions):
+        """
+        Apply `update` to each encoded `(old_state, action, new_state, reward)`
+        transition in order, where states are rows given by `encode` and
+        actions are columns given by `encode_action`.
+        """
+        q = self.q
+        available = self.available
+        self.policy = None
+        for old_state, action, new_state, reward in transitions:
+            future = available(new_state)
+            best_future = q[new_state, future].max() if len(future) else 0
+            old = q[old_state, action]
+            q[old_state, action] = old + self.alpha * (reward + best_future - old)
+
     def get_q_value(self, state, action):
         """
         Return the Q-value for the state `state` and the action `action`.
-        If no Q-value exists yet in `self.q`, return 0.
+        If no Q-value has been learned yet, this is 0.
         """
-        return self.q[(tuple(state), action)] if (tuple(state), action) in self.q.keys() else 0
+        return self.q[self.encode(state), self.encode_action(state, action)]
 
     def update_q_value(self, state, action, old_q, reward, future_rewards):
         """
@@ -118,7 +321,10 @@ class NimAI():
         `alpha` is the learning rate, and `new value estimate`
         is the sum of the current reward and estimated future rewards.
         """
-        self.q[(tuple(state), action)] = old_q + self.alpha * (reward + future_rewards - old_q)
+        self.q[self.encode(state), self.encode_action(state, action)] = (
+            old_q + self.alpha * (reward + future_rewards - old_q)
+        )
+        self.policy = None
 
     def best_future_reward(self, state):
         """
@@ -126,19 +332,33 @@ class NimAI():
         pairs available in that state and return the maximum of all
         of their Q-values.
 
-        Use 0 as the Q-value if a `(state, action)` pair has no
-        Q-value in `self.q`. If there are no available actions in
-        `state`, return 0.
+        Unlearned pairs have a Q-value of 0. If there are no
+        available actions in `state`, return 0.
         """
-        actions = Nim.available_actions(state)
-        best_move = 0
-        for action in actions:
-           if self.get_q_value(action=action, state=state) > best_move:
-               best_move = self.get_q_value(action=action, state=state)
-                
-        return best_move
+        s = self.encode(state)
+        available = self.available(s)
+        if not len(available):
+            return 0
+        return self.q[s, available].max()
 
-       
+    def choose_actions(self, states):
+        """
+        Return the best action for each state in `states`, as
+        `choose_action` with `epsilon` False would, or None for states
+        with no available actions.
+        """
+        if not states:
+            return []
+        policy = self.greedy_policy()
+        if self.symmetric:
+            rows = [self.encode(state) for state in states]
+        else:
+            rows = np.asarray(states, dtype=int).reshape(len(states), -1) @ self.strides
+        columns = policy[rows]
+        return [
+            self.decode_action(state, column) if column >= 0 else None
+            for state, column in zip(states, columns.tolist())
+        ]
 
     def choose_action(self, state, epsilon=True):
         """
@@ -155,85 +375,274 @@ class NimAI():
         If multiple actions have the same Q-value, any of those
         options is an acceptable return value.
         """
-        actions = list(Nim.available_actions(state))
-        best_index = 0
-        for action in actions:
-            if self.get_q_value(action=action, state=state) == self.best_future_reward(state=state):
-                break
-            best_index += 1
-        if best_index == len(actions):
-            best_index -= 1
-        if not epsilon:
-            return actions[best_index]
-        else:
-            prob = (1 - self.epsilon) * 100
-            rand = random.randint(1, 100)
-            if rand <= prob:
-                return actions[best_index]
-            else:
-                return actions[random.randint(0, len(actions) - 1)]
-            
-      
-
-def train(n):
+        s = self.encode(state)
+        available = self.available(s)
+        if epsilon and random.random() < self.epsilon:
+            return self.decode_action(state, random.choice(available))
+        return self.decode_action(state, available[self.q[s, available].argmax()])
+
+
+def sorted_states(shape):
+    """
+    Return every state whose piles are in non-decreasing order with pile
+    `i` at most `shape[i]`, for sorted `shape`, in lexicographic order.
+    """
+    states = [()]
+    for pile in shape:
+        states = [
+            state + (n,)
+            for state in states
+            for n in range(state[-1] if state else 0, pile + 1)
+        ]
+    return states
+
+
+def nim_sum(piles):
+    """
+    Return the bitwise exclusive or of all pile sizes.
     """
-    Train an AI by playing `n` games against itself.
+    total = 0
+    for pile in piles:
+        total ^= pile
+    return total
+
+
+def is_losing(piles):
+    """
+    Return True if the player to move from `piles` loses against
+    perfect play. Whoever removes the last object loses, as in
+    `Nim.move`, so with only piles of size 0 or 1 left the player to
+    move loses on an odd number of them; otherwise the player to move
+    loses exactly when the nim-sum is 0.
+    """
+    if all(pile <= 1 for pile in piles):
+        return sum(piles) % 2 == 1
+    return nim_sum(piles) == 0
+
+
+def optimal_actions(piles):
+    """
+    Return the set of actions from `piles` that leave the opponent in a
+    losing position, which is empty if every action loses.
+    """
+    actions = set()
+    for i, j in Nim.available_actions(piles):
+        after = list(piles)
+        after[i] -= j
+        if is_losing(after):
+            actions.add((i, j))
+    return actions
+
+
+@functools.lru_cache(maxsize=None)
+def winnable_states(initial):
+    """
+    Return a list of `(state, optimal_actions(state))` pairs for every
+    state reachable from the tuple of piles `initial` that can be won.
+    """
+    states = []
+    for state in itertools.product(*(range(pile + 1) for pile in initial)):
+        actions = optimal_actions(state)
+        if actions:
+            states.append((list(state), actions))
+    return states
+
+
+def evaluate(ai):
     """
+    Return the fraction of winnable states reachable from `ai.initial`
+    in which the AI's greedy action is an optimal one.
+    """
+    states = winnable_states(tuple(ai.initial))
+    if not states:
+        return 1.0
+    chosen = ai.choose_actions([state for state, _ in states])
+    optimal = sum(
+        action in actions
+        for action, (_, actions) in zip(chosen, states)
+    )
+    return optimal / len(states)
+
+
+def train(n, interval=1000, time_limit=None, tolerance=None,
+          initial=[1, 3, 5, 7], symmetric=False, target=None, steps=1):
+    """
+    Train an AI by playing `n` games against itself,
+    starting each game from piles `initial`, with `steps`-step
+    updates as described in `play_training_game`.
+
+    Progress is printed every `interval` games, or never if `interval`
+    is None. Training stops early once `time_limit` seconds have passed,
+    once no Q-value has changed by `tolerance` or more over the
+    last `interval` games, or once `evaluate` scores the AI at `target`
+    or above. `tolerance` and `target` are checked every `interval`
+    games, so they need an `interval`.
+    """
+    if interval is None and (tolerance is not None or target is not None):
+        raise ValueError("tolerance and target need an interval to be checked at")
 
-    player = NimAI()
+    player = NimAI(initial=initial, symmetric=symmetric)
+    start = time.perf_counter()
+    previous = player.q.copy()
 
     # Play n games
     for i in range(n):
-        print(f"Playing training game {i + 1}")
-        game = Nim()
+        play_training_game(player, steps=steps)
+        player.games += 1
+
+        elapsed = time.perf_counter() - start
+        out_of_time = time_limit is not None and elapsed >= time_limit
+        if interval is None or (i + 1) % interval:
+            if out_of_time:
+                print("Time limit reached")
+                break
+            continue
+
+        # Report progress and check whether to stop
+        print(f"Played {i + 1} games ({(i + 1) / elapsed:.0f} games/sec), "
+              f"{np.count_nonzero(player.q)} Q-values learned, "
+              f"epsilon {player.epsilon}")
+        if out_of_time:
+            print("Time limit reached")
+            break
+        if target is not None:
+            rate = evaluate(player)
+            print(f"Optimal move rate {rate:.2%}")
+            if rate >= target:
+                break
+        if tolerance is not None:
+            change = np.abs(player.q - previous).max()
+            if change < tolerance:
+                print(f"Converged, largest Q-value change {change:.2g}")
+                break
+            previous = player.q.copy()
 
-        # Keep track of last move made by either player
-        last = {
-            0: {"state": None, "action": None},
-            1: {"state": None, "action": None}
-        }
+    print("Done training")
 
-        # Game loop
-        while True:
-
-            # Keep track of current state and action
-            state = game.piles.copy()
-            action = player.choose_action(game.piles)
-
-            # Keep track of last state and action
-            last[game.player]["state"] = state
-            last[game.player]["action"] = action
-
-            # Make move
-            game.move(action)
-            new_state = game.piles.copy()
-
-            # When game is over, update Q values with rewards
-            if game.winner is not None:
-                player.update(state, action, new_state, -1)
-                player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
-                    new_state,
-                    1
-                )
-                break
+    # Return the trained AI
+    return player
 
-            # If game is continuing, no rewards yet
-            elif last[game.player]["state"] is not None:
-                player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
-                    new_state,
-                    0
-                )
+
+def train_parallel(n, workers=None, sync_every=250,
+                   initial=[1, 3, 5, 7], symmetric=False, steps=1):
+    """
+    Train an AI from `n` games of self-play generated by `workers`
+    processes (one per CPU by default), starting from piles `initial`.
+
+    Each round, every worker plays `sync_every` games with a snapshot of
+    the current Q-table and sends back its transitions, which are then
+    applied in order with the same update rule as `NimAI.update`.
+    The refreshed table is sent out with the next round.
+    """
+
+    player = NimAI(initial=initial, symmetric=symmetric)
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    played = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while played < n:
+            batches = []
+            for _ in range(workers):
+                games = min(sync_every, n - played)
+                if games <= 0:
+                    break
+                batches.append((player.q, player.initial, player.symmetric,
+                                player.alpha, player.epsilon, steps, games,
+                                random.getrandbits(32)))
+                played += games
+
+            # Apply every transition as if the games were played here
+            for transitions in executor.map(_self_play, batches):
+                player.update_batch(transitions)
+            player.games = played
+
+            elapsed = time.perf_counter() - start
+            print(f"Played {played} games ({played / elapsed:.0f} games/sec), "
+                  f"{np.count_nonzero(player.q)} Q-values learned, "
+                  f"epsilon {player.epsilon}")
 
     print("Done training")
 
-    # Return the trained AI
     return player
 
 
+def _self_play(batch):
+    """
+    Play `games` games with a copy of a Q-table and return their
+    transitions, encoded for `NimAI.update_batch`.
+    """
+    q, initial, symmetric, alpha, epsilon, steps, games, seed = batch
+    random.seed(seed)
+    player = NimAI(alpha=alpha, epsilon=epsilon, initial=initial,
+                   symmetric=symmetric)
+    player.q = q
+    transitions = []
+    for _ in range(games):
+        for old_state, action, new_state, reward in play_training_game(
+                player, learn=False, steps=steps):
+            transitions.append((player.encode(old_state), player.encode_action(old_state, action),
+                                player.encode(new_state), reward))
+    return transitions
+
+
+def play_training_game(player, learn=True, steps=1):
+    """
+    Play one game of `player` against itself, updating its Q-values
+    unless `learn` is False.
+
+    Each move is updated `steps` moves later by the same player, towards
+    the best Q-value of the state reached then, or towards the final
+    reward if the game ends first. With `steps` of 1 this is one-step
+    Q-learning; larger values carry rewards back further every game.
+
+    Return the list of `(old_state, action, new_state, reward)`
+    updates made during the game, in order.
+    """
+    transitions = []
+    game = Nim(player.initial)
+
+    def record(state, action, new_state, reward):
+        transitions.append((state, action, new_state, reward))
+        if learn:
+            player.update(state, action, new_state, reward)
+
+    # Keep track of the moves made by either player not yet updated
+    last = {
+        0: deque(),
+        1: deque()
+    }
+
+    # Game loop
+    while True:
+
+        # Keep track of current state and action
+        state = game.piles.copy()
+        action = player.choose_action(game.piles)
+
+        # Keep track of last state and action
+        last[game.player].append((state, action))
+
+        # Make move
+        game.move(action)
+        new_state = game.piles.copy()
+
+        # When game is over, update Q values with rewards
+        if game.winner is not None:
+            for old_state, old_action in last[Nim.other_player(game.winner)]:
+                record(old_state, old_action, new_state, -1)
+            for old_state, old_action in last[game.winner]:
+                record(old_state, old_action, new_state, 1)
+            break
+
+        # If game is continuing, no rewards yet
+        elif len(last[game.player]) == steps:
+            old_state, old_action = last[game.player].popleft()
+            record(old_state, old_action, new_state, 0)
+
+    return transitions
+
+
 def play(ai, human_player=None):
     """
     Play human game against the AI.
@@ -246,7 +655,7 @@ def play(ai, human_player=None):
         human_player = random.randint(0, 1)
 
     # Create new game
-    game = Nim()
+    game = Nim(ai.initial)
 
     # Game loop
     while True:
@@ -1,4 +1,13 @@
-from nim import train, play
+import os
 
-ai = train(20000)
+from nim import NimAI, train, play
+
+# Reuse a previously trained AI if one has been saved
+SAVED = "nim.qtable"
+
+if os.path.exists(SAVED):
+    ai = NimAI.load(SAVED)
+else:
+    ai = train(20000)
+    ai.save(SAVED)
 play(ai)
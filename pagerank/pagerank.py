@@ -1,21 +1,35 @@
+import argparse
 import os
 import random
 import re
-import sys
+
+import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 0.001
+MAX_ITERATIONS = 1000
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Rank the pages of a corpus.")
+    parser.add_argument("corpus", help="directory of HTML pages")
+    parser.add_argument("--sparse", action="store_true",
+                        help="iterate with a sparse transition matrix")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"largest change in any rank at convergence "
+                        f"(default: {TOLERANCE})")
+    parser.add_argument("--max-iterations", type=int, default=MAX_ITERATIONS,
+                        help=f"most iterations to run (default: {MAX_ITERATIONS})")
+    args = parser.parse_args()
+    corpus = crawl(args.corpus)
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
+    ranks = iterate_pagerank(corpus, DAMPING, tolerance=args.tolerance,
+                             max_iterations=args.max_iterations,
+                             sparse=args.sparse)
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
@@ -113,7 +127,8 @@ def pick_prob(d: dict):
         if r <= cumulative:
             return key
 
-def iterate_pagerank(corpus:dict, damping_factor):
+def iterate_pagerank(corpus:dict, damping_factor, tolerance=TOLERANCE,
+                     max_iterations=MAX_ITERATIONS, sparse=False):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -121,7 +136,13 @@ def iterate_pagerank(corpus:dict, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Iteration stops once no value changes by `tolerance` or more, or
+    after `max_iterations` updates. If `sparse` is true, iterate with
+    `sparse_pagerank` instead, which scales to large corpora.
     """
+    if sparse:
+        return sparse_pagerank(corpus, damping_factor, tolerance, max_iterations)
     
     num_pages = len(corpus)
     pages = list(corpus.keys())
@@ -130,7 +151,8 @@ def iterate_pagerank(corpus:dict, damping_factor):
     dict_ranks = {page: 1 / num_pages for page in pages}
     
     converged = False
-    while not converged:
+    iterations = 0
+    while not converged and iterations < max_iterations:
         new_ranks = {}
         for page in pages:
            
@@ -148,11 +170,54 @@ def iterate_pagerank(corpus:dict, damping_factor):
 
             new_ranks[page] = new_rank
 
-        converged = all(abs(new_ranks[p] - dict_ranks[p]) < 0.001 for p in pages)
+        converged = all(abs(new_ranks[p] - dict_ranks[p]) < tolerance for p in pages)
         dict_ranks = new_ranks
+        iterations += 1
 
     return dict_ranks
 
+
+def sparse_pagerank(corpus:dict, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS):
+    """
+    Return the same PageRank values as `iterate_pagerank`, computed by
+    power iteration over a sparse transition matrix in CSR form, so each
+    iteration costs time proportional to the number of links rather than
+    the square of the number of pages. A page with no links is treated
+    as linking to every page, including itself.
+    """
+    pages = list(corpus.keys())
+    num_pages = len(pages)
+    index = {page: i for i, page in enumerate(pages)}
+
+    # Row i of the matrix holds the pages linked to by page i
+    out_degree = np.array([len(corpus[page]) for page in pages], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(out_degree)))
+    indices = np.fromiter(
+        (index[link] for page in pages for link in corpus[page]),
+        dtype=np.int64, count=indptr[-1]
+    )
+    sources = np.repeat(np.arange(num_pages), out_degree)
+    dangling = out_degree == 0
+    share = np.where(dangling, 0, 1 / np.maximum(out_degree, 1))
+
+    ranks = np.full(num_pages, 1 / num_pages)
+    for _ in range(max_iterations):
+
+        # Each page splits its rank evenly among the pages it links to,
+        # and pages without links split theirs among every page
+        flow = np.bincount(indices, weights=(ranks * share)[sources], minlength=num_pages)
+        new_ranks = (1 - damping_factor) / num_pages + damping_factor * (
+            flow + ranks[dangling].sum() / num_pages
+        )
+
+        converged = np.abs(new_ranks - ranks).max() < tolerance
+        ranks = new_ranks
+        if converged:
+            break
+
+    return {page: float(ranks[i]) for i, page in enumerate(pages)}
+
  
 
 